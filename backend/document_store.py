@@ -2,7 +2,15 @@ from __future__ import annotations
 
 import asyncio
 from typing import Tuple, Optional
-import time
+
+import aiorwlock
+import orjson
+
+from rope import Rope
+
+
+class DocumentTooLarge(ValueError):
+    """Raised when an edit would grow the document past the store's max_length."""
 
 
 class DocumentStore:
@@ -12,18 +20,31 @@ class DocumentStore:
     OS Concepts Demonstrated:
     - Shared Resource: The document string is shared among threads (clients).
     - Critical Sections: Any mutation or read of mutable shared state is protected.
-    - Synchronization: A single mutex (Lock) provides mutual exclusion.
-    - Race Condition Avoidance: Only one thread can read/write at a time, ensuring consistency.
+    - Synchronization: A reader-writer lock lets readers overlap while writers are exclusive.
+    - Race Condition Avoidance: No reader observes a partially applied write, ensuring consistency.
     """
 
-    def __init__(self, lock_timeout: float = 3.0) -> None:
-        self._document: str = ""
+    def __init__(self, lock_timeout: float = 3.0, max_length: Optional[int] = None) -> None:
+        # The content is held as a str, a Rope, or both when they agree: full
+        # replacements store only the str, and the Rope is built from it on
+        # the first incremental edit, which in turn invalidates the str.
+        self._document: Optional[Rope] = None
+        self._snapshot: Optional[str] = ""
+        # JSON encoding of the content, shared by every snapshot sent until the next write.
+        self._encoded: Optional[bytes] = None
         self._version: int = 0
-        self._lock: asyncio.Lock = asyncio.Lock()
+        # Upper bound on document length in code points; None means unbounded.
+        self._max_length: Optional[int] = max_length
+        # fast=True skips a scheduler round-trip on uncontended acquires; safe
+        # because no critical section below awaits while holding the lock.
+        self._lock: aiorwlock.RWLock = aiorwlock.RWLock(fast=True)
         # Editor lock state
         self._editor_lock_holder: Optional[str] = None
-        self._editor_lock_expires: float = 0.0
         self._lock_timeout: float = lock_timeout
+        # One-shot timer that clears the holder after lock_timeout; the
+        # generation counter discards timers superseded by renew/release.
+        self._expiry_task: Optional[asyncio.Task[None]] = None
+        self._editor_lock_generation: int = 0
 
     async def get_document(self) -> Tuple[str, int]:
         """
@@ -32,8 +53,21 @@ class DocumentStore:
         Guarded read: although Python reads of strings are atomic,
         we guard to ensure the version and content are consistent as a pair.
         """
-        async with self._lock:
-            return self._document, self._version
+        async with self._lock.reader_lock:
+            return self._materialize(), self._version
+
+    async def get_encoded_document(self) -> Tuple[bytes, int]:
+        """
+        Return the document content as a JSON string literal (bytes) and its version.
+
+        The encoding is cached until the next write, so a burst of clients
+        joining at the same version shares a single encode.
+        """
+        async with self._lock.reader_lock:
+            # Same reasoning as _materialize: filling the cache never awaits.
+            if self._encoded is None:
+                self._encoded = orjson.dumps(self._materialize())
+            return self._encoded, self._version
 
     async def update_document(self, new_content: str) -> int:
         """
@@ -42,11 +76,102 @@ class DocumentStore:
         This is a document-level replacement (MVP) with last-write-wins semantics.
         Returns the new version.
         """
-        async with self._lock:  # Critical section: mutate shared state
-            self._document = new_content
-            self._version += 1
+        async with self._lock.writer_lock:  # Critical section: mutate shared state
+            self._replace(new_content)
             return self._version
 
+    async def try_update_document(self, client_id: str, new_content: str) -> Tuple[bool, Optional[str], int]:
+        """
+        Replace the document if `client_id` may edit (it holds the editor lock, or nobody does).
+
+        The holder check and the write share one critical section, so the lock
+        cannot change hands in between. Raises DocumentTooLarge past max_length.
+        Returns (updated, lock_holder, version).
+        """
+        async with self._lock.writer_lock:
+            if not self._may_edit(client_id):
+                return False, self._editor_lock_holder, self._version
+            self._replace(new_content)
+            return True, self._editor_lock_holder, self._version
+
+    async def try_insert_text(self, client_id: str, pos: int, text: str) -> Tuple[bool, Optional[str], int]:
+        """
+        Insert `text` at code-point offset `pos` if `client_id` holds the editor lock.
+
+        Incremental ops are never transformed, so unlike full replacement they
+        require the lock: two unlocked clients could otherwise edit the same base.
+
+        Raises ValueError if `pos` is outside the document, or DocumentTooLarge
+        past max_length. Returns (updated, lock_holder, version).
+        """
+        async with self._lock.writer_lock:
+            if self._editor_lock_holder != client_id:
+                return False, self._editor_lock_holder, self._version
+            self._insert(pos, text)
+            return True, self._editor_lock_holder, self._version
+
+    async def try_delete_text(self, client_id: str, pos: int, length: int) -> Tuple[bool, Optional[str], int]:
+        """
+        Delete `length` code points starting at `pos` if `client_id` holds the editor lock.
+
+        Raises ValueError if the range is outside the document. Returns (updated, lock_holder, version).
+        """
+        async with self._lock.writer_lock:
+            if self._editor_lock_holder != client_id:
+                return False, self._editor_lock_holder, self._version
+            self._delete(pos, length)
+            return True, self._editor_lock_holder, self._version
+
+    def _may_edit(self, client_id: str) -> bool:
+        return self._editor_lock_holder is None or self._editor_lock_holder == client_id
+
+    def _replace(self, new_content: str) -> None:
+        # Caller holds the writer lock.
+        self._check_length(len(new_content))
+        self._document = None
+        self._snapshot = new_content
+        self._encoded = None
+        self._version += 1
+
+    def _insert(self, pos: int, text: str) -> None:
+        # Caller holds the writer lock.
+        document = self._rope()
+        if not 0 <= pos <= len(document):
+            raise ValueError("insert position out of range")
+        self._check_length(len(document) + len(text))
+        document.insert(pos, text)
+        self._snapshot = None
+        self._encoded = None
+        self._version += 1
+
+    def _delete(self, pos: int, length: int) -> None:
+        # Caller holds the writer lock.
+        document = self._rope()
+        if pos < 0 or length < 0 or pos + length > len(document):
+            raise ValueError("delete range out of range")
+        document.delete(pos, length)
+        self._snapshot = None
+        self._encoded = None
+        self._version += 1
+
+    def _rope(self) -> Rope:
+        # Caller holds the writer lock, or the reader lock with _snapshot unset
+        # (the Rope then already exists).
+        if self._document is None:
+            self._document = Rope(self._snapshot or "")
+        return self._document
+
+    def _check_length(self, length: int) -> None:
+        if self._max_length is not None and length > self._max_length:
+            raise DocumentTooLarge(f"document would be {length} code points, limit is {self._max_length}")
+
+    def _materialize(self) -> str:
+        # Caller holds the lock. Caching under the reader lock is safe: the
+        # join never awaits, so concurrent readers cannot interleave here.
+        if self._snapshot is None:
+            self._snapshot = str(self._rope())
+        return self._snapshot
+
     # --- Locking API ---
 
     async def try_acquire_editor_lock(self, client_id: str) -> bool:
@@ -54,59 +179,60 @@ class DocumentStore:
         Attempt to acquire the editor lock for a client.
         Returns True if acquired (or already held by client), False otherwise.
         """
-        async with self._lock:
-            now = time.time()
-            # Expire old lock if needed
-            if self._editor_lock_holder and now > self._editor_lock_expires:
-                self._editor_lock_holder = None
+        # Fast path: fail without touching the store lock when another client
+        # holds the lock. Safe on a single event loop since no await separates
+        # the read from the return; expired locks are already cleared.
+        holder = self._editor_lock_holder
+        if holder and holder != client_id:
+            return False
 
+        async with self._lock.writer_lock:
             if not self._editor_lock_holder or self._editor_lock_holder == client_id:
                 self._editor_lock_holder = client_id
-                self._editor_lock_expires = now + self._lock_timeout
+                self._schedule_expiry()
                 return True
             return False
 
     async def release_editor_lock(self, client_id: str) -> None:
         """Release the editor lock if held by this client."""
-        async with self._lock:
+        async with self._lock.writer_lock:
             if self._editor_lock_holder == client_id:
                 self._editor_lock_holder = None
-                self._editor_lock_expires = 0.0
+                self._cancel_expiry()
 
     async def renew_editor_lock(self, client_id: str) -> bool:
         """Renew the editor lock if held by this client; returns True on success."""
-        async with self._lock:
-            now = time.time()
-            if self._editor_lock_holder == client_id and now <= self._editor_lock_expires:
-                self._editor_lock_expires = now + self._lock_timeout
+        async with self._lock.writer_lock:
+            if self._editor_lock_holder == client_id:
+                self._schedule_expiry()
                 return True
             return False
 
     async def get_lock_status(self) -> Tuple[Optional[str], bool]:
-        """Return (lock_holder_id, is_locked), expiring stale locks."""
-        async with self._lock:
-            now = time.time()
-            if self._editor_lock_holder and now > self._editor_lock_expires:
+        """Return (lock_holder_id, is_locked)."""
+        # Lock-free: the expiry timer clears stale holders, so this is a
+        # plain read of a single attribute.
+        holder = self._editor_lock_holder
+        return holder, holder is not None
+
+    def _schedule_expiry(self) -> None:
+        """(Re)start the one-shot timer that expires the current editor lock. Caller holds the writer lock."""
+        self._cancel_expiry()
+        self._expiry_task = asyncio.create_task(
+            self._expire_after(self._lock_timeout, self._editor_lock_generation)
+        )
+
+    def _cancel_expiry(self) -> None:
+        # Bumping the generation also invalidates a timer that has already
+        # woken up and is waiting on the writer lock.
+        self._editor_lock_generation += 1
+        if self._expiry_task is not None:
+            self._expiry_task.cancel()
+            self._expiry_task = None
+
+    async def _expire_after(self, delay: float, generation: int) -> None:
+        await asyncio.sleep(delay)
+        async with self._lock.writer_lock:
+            if generation == self._editor_lock_generation:
                 self._editor_lock_holder = None
-            return self._editor_lock_holder, self._editor_lock_holder is not None
-
-    async def apply_edit(self, operation: dict) -> Tuple[str, int]:
-        """
-        Apply an edit operation. For MVP we accept full replacement operations:
-        {"type": "replace", "content": str}
-
-        Returns (content, version) after applying.
-
-        Future enhancement: Operational Transformation for insert/delete at positions.
-        """
-        op_type = operation.get("type")
-        if op_type == "replace":
-            content = operation.get("content", "")
-            new_version = await self.update_document(content)
-            async with self._lock:
-                return self._document, new_version
-        else:
-            async with self._lock:
-                return self._document, self._version
-
-
+                self._expiry_task = None
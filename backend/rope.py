@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from typing import List, Tuple
+
+
+class Rope:
+    """
+    Mutable text stored as a sequence of bounded-size chunks.
+
+    A flattened rope: insert and delete rewrite only the one or two chunks
+    around the edit instead of copying the whole document, and str() joins
+    the chunks on demand. Offsets are code points, as with Python str.
+
+    Finding a chunk is a linear scan over chunk lengths, so an edit costs
+    O(len / CHUNK_SIZE + CHUNK_SIZE) rather than a tree rope's O(log n); at
+    2048 code points per chunk that is about 500 steps per MiB.
+    """
+
+    CHUNK_SIZE = 2048
+
+    def __init__(self, text: str = "") -> None:
+        self._chunks: List[str] = self._split(text)
+        self._length: int = len(text)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __str__(self) -> str:
+        return "".join(self._chunks)
+
+    def insert(self, pos: int, text: str) -> None:
+        """Insert `text` before offset `pos` (0 <= pos <= len)."""
+        if not text:
+            return
+        if not self._chunks:
+            self._chunks = self._split(text)
+        else:
+            i, off = self._locate(pos)
+            chunk = self._chunks[i]
+            self._chunks[i:i + 1] = self._split(chunk[:off] + text + chunk[off:])
+        self._length += len(text)
+
+    def delete(self, pos: int, length: int) -> None:
+        """Delete `length` code points starting at offset `pos`."""
+        if length <= 0:
+            return
+        i, start = self._locate(pos)
+        j, end = self._locate(pos + length)
+        merged = self._chunks[i][:start] + self._chunks[j][end:]
+        # Fold short leftovers into the previous chunk to limit fragmentation.
+        if merged and i > 0 and len(self._chunks[i - 1]) + len(merged) <= self.CHUNK_SIZE:
+            i -= 1
+            merged = self._chunks[i] + merged
+        self._chunks[i:j + 1] = self._split(merged)
+        self._length -= length
+
+    def _locate(self, pos: int) -> Tuple[int, int]:
+        """
+        Return (chunk index, offset in chunk) for `pos` by scanning chunk lengths.
+
+        A chunk boundary maps to the end of the earlier chunk.
+        """
+        for i, chunk in enumerate(self._chunks):
+            if pos <= len(chunk):
+                return i, pos
+            pos -= len(chunk)
+        raise IndexError("rope offset out of range")
+
+    @classmethod
+    def _split(cls, text: str) -> List[str]:
+        size = cls.CHUNK_SIZE
+        return [text[i:i + size] for i in range(0, len(text), size)]
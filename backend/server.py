@@ -1,40 +1,177 @@
 from __future__ import annotations
 
-import json
+import asyncio
 import logging
 import os
+import sys
 import uuid
-from typing import Dict, Any, List
+from collections import deque
+from typing import Awaitable, Callable, Dict, Any, Deque, List, Optional, Tuple
 
+import orjson
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
-from document_store import DocumentStore
+from document_store import DocumentStore, DocumentTooLarge
 
 
 logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(levelname)s: %(message)s")
 
 
+# Maximum number of control messages buffered per client before new ones are dropped.
+OUTBOUND_QUEUE_SIZE = 64
+
+# Largest document, in code points, that edits may produce.
+MAX_DOCUMENT_LENGTH = 2 ** 20
+
+# Largest inbound WebSocket frame: a full replacement of a maximal document
+# must still fit, or the socket closes with 1009 instead of answering
+# "document_too_large". JSON escapes a code point in at most 6 bytes
+# (a control character as \u00XX); the rest covers the edit envelope.
+MAX_MESSAGE_BYTES = 6 * MAX_DOCUMENT_LENGTH + 2 ** 10
+
+# Quiet period before a burst of full-document edits from one client is applied.
+EDIT_DEBOUNCE_SECONDS = float(os.environ.get("EDIT_DEBOUNCE_MS", "20")) / 1000
+
+
+class EditDebouncer:
+    """
+    Auto-batches full-document edits from a single client.
+
+    Replacements are last-write-wins, so within a burst only the latest
+    content matters: each submit overwrites the pending content, and one
+    timer per burst applies whatever is pending when it fires.
+    """
+
+    def __init__(self, apply: Callable[[str], Awaitable[None]], delay: float) -> None:
+        self._apply = apply
+        self._delay = delay
+        self._pending: Optional[str] = None
+        self._timer: Optional[asyncio.Task[None]] = None
+        # Serializes applies so flush() also waits for one already in flight.
+        self._lock = asyncio.Lock()
+
+    def submit(self, content: str) -> None:
+        self._pending = content
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def flush(self) -> None:
+        """Apply the pending content now, if any."""
+        async with self._lock:
+            content, self._pending = self._pending, None
+            if content is not None:
+                await self._apply(content)
+
+    def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self._delay)
+        # Detach before applying so a submit during a slow apply arms a new timer
+        # instead of leaving its content pending.
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as exc:
+            logging.debug("Debounced edit failed: %s", exc)
+
+
+class ClientConnection:
+    """
+    A connected client: its socket, debounced edits and pending outbound messages.
+
+    A dedicated writer task drains the outbound messages, so publishers never wait on a slow or
+    backpressured peer: enqueueing is O(1) and non-blocking.
+
+    Document snapshots are last-write-wins, so only the latest un-sent one is
+    kept; control messages (lock status etc.) are queued in order. Messages
+    arrive pre-encoded as UTF-8 JSON and go out as binary frames, so a payload
+    is encoded once per broadcast rather than once per peer.
+    """
+
+    def __init__(self, client_id: str, ws: WebSocket) -> None:
+        self.client_id = client_id
+        self.ws = ws
+        self.pending_edits = EditDebouncer(lambda content: apply_replace(self, content), EDIT_DEBOUNCE_SECONDS)
+        self._control: Deque[bytes] = deque()
+        self._latest_doc: Optional[bytes] = None
+        # Position of the pending document among the queued control messages.
+        self._latest_doc_index: int = 0
+        self._event = asyncio.Event()
+        self._writer: asyncio.Task[None] = asyncio.create_task(self._drain())
+
+    def send(self, message: bytes) -> bool:
+        """Queue a control message; returns False if the queue is full and it was dropped."""
+        if len(self._control) >= OUTBOUND_QUEUE_SIZE:
+            logging.warning("Outbound queue full; dropping message for slow client")
+            return False
+        self._control.append(message)
+        self._event.set()
+        return True
+
+    def send_document(self, payload: bytes) -> None:
+        """Replace any pending, un-sent document snapshot with `payload`."""
+        self._latest_doc = payload
+        self._latest_doc_index = len(self._control)
+        self._event.set()
+
+    def close(self) -> None:
+        self.pending_edits.close()
+        self._writer.cancel()
+
+    def _take_batch(self) -> List[bytes]:
+        batch = list(self._control)
+        if self._latest_doc is not None:
+            batch.insert(self._latest_doc_index, self._latest_doc)
+        self._control.clear()
+        self._latest_doc = None
+        self._latest_doc_index = 0
+        self._event.clear()
+        return batch
+
+    async def _drain(self) -> None:
+        try:
+            while True:
+                await self._event.wait()
+                for message in self._take_batch():
+                    await self.ws.send_bytes(message)
+        except Exception as exc:
+            logging.debug("Outbound writer stopped: %s", exc)
+
+
 class ClientRegistry:
-    """Async-safe registry of connected clients with IDs."""
+    """
+    Async-safe registry of connected clients with IDs.
+
+    Deliberately lock-free: every call runs on the single event-loop thread
+    and none of them awaits, so dict mutations cannot interleave.
+    """
 
     def __init__(self) -> None:
-        self._clients: Dict[str, WebSocket] = {}
+        self._clients: Dict[str, ClientConnection] = {}
 
-    def add(self, client_id: str, ws: WebSocket) -> int:
-        self._clients[client_id] = ws
-        return len(self._clients)
+    def add(self, client_id: str, ws: WebSocket) -> ClientConnection:
+        conn = ClientConnection(client_id, ws)
+        self._clients[client_id] = conn
+        return conn
 
     def remove(self, client_id: str) -> int:
-        self._clients.pop(client_id, None)
+        conn = self._clients.pop(client_id, None)
+        if conn is not None:
+            conn.close()
+        return len(self._clients)
+
+    def count(self) -> int:
         return len(self._clients)
 
-    def snapshot(self) -> Dict[str, WebSocket]:
-        return dict(self._clients)
+    def snapshot(self) -> Tuple[ClientConnection, ...]:
+        return tuple(self._clients.values())
 
 
-document_store = DocumentStore(lock_timeout=3.0)
+document_store = DocumentStore(lock_timeout=3.0, max_length=MAX_DOCUMENT_LENGTH)
 clients = ClientRegistry()
 
 app = FastAPI()
@@ -55,14 +192,211 @@ async def healthz():
     return JSONResponse({"status": "ok"})
 
 
-async def broadcast(message: str, exclude: WebSocket | None = None) -> None:
-    snapshot = clients.snapshot()
-    targets: List[WebSocket] = [ws for ws in snapshot.values() if ws is not exclude]
-    for ws in targets:
-        try:
-            await ws.send_text(message)
-        except Exception:
-            pass
+def broadcast(message: bytes, exclude: WebSocket | None = None) -> List[ClientConnection]:
+    """
+    Queue a message on every client's outbound queue, except `exclude`.
+
+    Returns the clients whose queue was full and dropped the message.
+    """
+    if clients.count() <= (1 if exclude is not None else 0):  # No targets besides `exclude`
+        return []
+    return [conn for conn in clients.snapshot() if conn.ws is not exclude and not conn.send(message)]
+
+
+def broadcast_document(payload: bytes, exclude: WebSocket | None = None) -> None:
+    """Offer a document snapshot to every client except `exclude`, superseding any unsent one."""
+    if clients.count() <= (1 if exclude is not None else 0):  # No targets besides `exclude`
+        return
+    for conn in clients.snapshot():
+        if conn.ws is not exclude:
+            conn.send_document(payload)
+
+
+async def document_message(msg_type: str, **extra: Any) -> bytes:
+    """
+    Encode a full-document message of type `msg_type` with any `extra` fields.
+
+    The content is spliced in from the store's cached encoding rather than
+    re-encoded, so concurrent joiners share one encode per version.
+    """
+    encoded_content, version = await document_store.get_encoded_document()
+    lock_holder, is_locked = await document_store.get_lock_status()
+    envelope = orjson.dumps({
+        "type": msg_type,
+        **extra,
+        "version": version,
+        "clients": clients.count(),
+        "lock_holder": lock_holder,
+        "is_locked": is_locked,
+    })
+    return b"".join((envelope[:-1], b',"content":', encoded_content, b"}"))
+
+
+async def resync(targets: List[ClientConnection]) -> None:
+    """Queue a full document snapshot for clients that missed an incremental update."""
+    payload = await document_message("document")
+    for conn in targets:
+        conn.send_document(payload)
+
+
+async def broadcast_lock_status(lock_holder: Optional[str]) -> None:
+    """
+    Tell every client who holds the editor lock.
+
+    A client whose queue drops the status would keep a stale lock state, so it
+    gets a snapshot instead, which carries lock_holder/is_locked too.
+    """
+    lagging = broadcast(orjson.dumps({
+        "type": "lock_status",
+        "is_locked": lock_holder is not None,
+        "lock_holder": lock_holder,
+    }))
+    if lagging:
+        await resync(lagging)
+
+
+async def apply_replace(client: ClientConnection, content: str) -> None:
+    """Replace the document, broadcast the snapshot to peers and ack the sender."""
+    ws = client.ws
+    try:
+        updated, lock_holder, updated_version = await document_store.try_update_document(client.client_id, content)
+    except DocumentTooLarge:
+        await _send_document_too_large(ws)
+        return
+    if not updated:
+        await _send_edit_locked(ws, lock_holder)
+        return
+    num_clients = clients.count()
+    if num_clients > 1:  # Skip encoding the document when there are no peers
+        # Encode once here; every peer receives the same bytes. Re-encoding
+        # the content with orjson is cheaper than locating and splicing the
+        # raw content slice out of the received frame, which needs a Python-level scan.
+        broadcast_document(orjson.dumps({
+            "type": "document",
+            "content": content,
+            "version": updated_version,
+            "clients": num_clients,
+            "lock_holder": lock_holder,
+            "is_locked": lock_holder is not None,
+        }), exclude=ws)
+    await ws.send_bytes(orjson.dumps({"type": "ack", "version": updated_version}))
+
+
+async def _send_document_too_large(ws: WebSocket) -> None:
+    await ws.send_bytes(orjson.dumps({"type": "error", "message": "document_too_large"}))
+
+
+async def _send_edit_locked(ws: WebSocket, lock_holder: Optional[str]) -> None:
+    await ws.send_bytes(orjson.dumps({
+        "type": "error",
+        "message": "edit_locked",
+        "lock_holder": lock_holder,
+    }))
+
+
+def _is_offset(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+async def _handle_get_document(client: ClientConnection, message: Dict[str, Any]) -> None:
+    await client.ws.send_bytes(await document_message("document"))
+
+
+async def _handle_request_lock(client: ClientConnection, message: Dict[str, Any]) -> None:
+    acquired = await document_store.try_acquire_editor_lock(client.client_id)
+    await client.ws.send_bytes(orjson.dumps({
+        "type": "lock_response",
+        "acquired": acquired,
+        "lock_holder": client.client_id if acquired else None,
+    }))
+    if acquired:
+        await broadcast_lock_status(client.client_id)
+
+
+async def _handle_release_lock(client: ClientConnection, message: Dict[str, Any]) -> None:
+    # Land a debounced edit while this client still holds the lock.
+    await client.pending_edits.flush()
+    await document_store.release_editor_lock(client.client_id)
+    await client.ws.send_bytes(orjson.dumps({"type": "lock_released"}))
+    await broadcast_lock_status(None)
+
+
+async def _handle_renew_lock(client: ClientConnection, message: Dict[str, Any]) -> None:
+    renewed = await document_store.renew_editor_lock(client.client_id)
+    await client.ws.send_bytes(orjson.dumps({"type": "lock_renewed", "renewed": renewed}))
+
+
+async def _handle_edit(client: ClientConnection, message: Dict[str, Any]) -> None:
+    ws = client.ws
+    op = message.get("op", "replace")
+    if op == "replace":
+        new_content = message.get("content", "")
+        if not isinstance(new_content, str):
+            await ws.send_bytes(orjson.dumps({"type": "error", "message": "invalid_op"}))
+            return
+        # The editor lock is checked when the debounced edit is written.
+        client.pending_edits.submit(new_content)
+        return
+
+    # Deltas apply to the latest content, so land any debounced replacement first.
+    await client.pending_edits.flush()
+    update: Dict[str, Any]
+    try:
+        if op == "insert":
+            pos, op_text = message.get("pos"), message.get("text")
+            if not _is_offset(pos) or not isinstance(op_text, str):
+                raise ValueError("malformed insert")
+            updated, lock_holder, updated_version = await document_store.try_insert_text(
+                client.client_id, pos, op_text
+            )
+            update = {"type": "op", "op": "insert", "pos": pos, "text": op_text}
+        elif op == "delete":
+            pos, length = message.get("pos"), message.get("len")
+            if not _is_offset(pos) or not _is_offset(length):
+                raise ValueError("malformed delete")
+            updated, lock_holder, updated_version = await document_store.try_delete_text(
+                client.client_id, pos, length
+            )
+            update = {"type": "op", "op": "delete", "pos": pos, "len": length}
+        else:
+            raise ValueError("unknown op")
+    except DocumentTooLarge:
+        await _send_document_too_large(ws)
+        return
+    except ValueError:
+        await ws.send_bytes(orjson.dumps({"type": "error", "message": "invalid_op"}))
+        return
+    if not updated:
+        await _send_edit_locked(ws, lock_holder)
+        return
+
+    await ws.send_bytes(orjson.dumps({"type": "ack", "version": updated_version}))
+    num_clients = clients.count()
+    if num_clients > 1:  # Skip encoding the update when there are no peers
+        update.update({
+            "version": updated_version,
+            "clients": num_clients,
+            "lock_holder": lock_holder,
+            "is_locked": lock_holder is not None,
+        })
+        # Deltas must arrive in order; peers that dropped one get a full snapshot.
+        lagging = broadcast(orjson.dumps(update), exclude=ws)
+        if lagging:
+            await resync(lagging)
+
+
+async def _handle_unknown(client: ClientConnection, message: Dict[str, Any]) -> None:
+    await client.ws.send_bytes(orjson.dumps({"type": "error", "message": "unknown_type"}))
+
+
+# Message type -> handler; anything else gets _handle_unknown.
+HANDLERS: Dict[str, Callable[[ClientConnection, Dict[str, Any]], Awaitable[None]]] = {
+    "get_document": _handle_get_document,
+    "request_lock": _handle_request_lock,
+    "release_lock": _handle_release_lock,
+    "renew_lock": _handle_renew_lock,
+    "edit": _handle_edit,
+}
 
 
 @app.websocket("/ws")
@@ -72,107 +406,42 @@ async def websocket_endpoint(ws: WebSocket) -> None:
 
     OS Concepts:
     - Shared Resource: The in-memory document content is shared by all clients.
-    - Critical Sections: All reads/writes to shared state are guarded by an asyncio.Lock in DocumentStore.
+    - Critical Sections: All reads/writes to shared state are guarded by a reader-writer lock in DocumentStore.
     - Mutual Exclusion: The editor lock provides app-level exclusivity for edits.
     - Non-blocking I/O: All network operations use await to avoid blocking the event loop.
     """
     await ws.accept()
     client_id = str(uuid.uuid4())
-    num = clients.add(client_id, ws)
-    logging.info(f"Client {client_id} connected. Active clients={num}")
+    client = clients.add(client_id, ws)
+    logging.info(f"Client {client_id} connected. Active clients={clients.count()}")
 
     try:
-        content, version = await document_store.get_document()
-        lock_holder, is_locked = await document_store.get_lock_status()
-        await ws.send_text(json.dumps({
-            "type": "init",
-            "client_id": client_id,
-            "content": content,
-            "version": version,
-            "clients": num,
-            "lock_holder": lock_holder,
-            "is_locked": is_locked,
-        }))
+        await ws.send_bytes(await document_message("init", client_id=client_id))
 
         while True:
             text = await ws.receive_text()
             try:
-                message: Dict[str, Any] = json.loads(text)
-            except json.JSONDecodeError:
-                await ws.send_text(json.dumps({"type": "error", "message": "invalid_json"}))
+                message: Dict[str, Any] = orjson.loads(text)
+            except orjson.JSONDecodeError:
+                await ws.send_bytes(orjson.dumps({"type": "error", "message": "invalid_json"}))
                 continue
 
-            mtype = message.get("type")
-            if mtype == "get_document":
-                content, version = await document_store.get_document()
-                lock_holder, is_locked = await document_store.get_lock_status()
-                await ws.send_text(json.dumps({
-                    "type": "document",
-                    "content": content,
-                    "version": version,
-                    "clients": len(clients.snapshot()),
-                    "lock_holder": lock_holder,
-                    "is_locked": is_locked,
-                }))
-            elif mtype == "request_lock":
-                acquired = await document_store.try_acquire_editor_lock(client_id)
-                await ws.send_text(json.dumps({
-                    "type": "lock_response",
-                    "acquired": acquired,
-                    "lock_holder": client_id if acquired else None,
-                }))
-                if acquired:
-                    await broadcast(json.dumps({
-                        "type": "lock_status",
-                        "is_locked": True,
-                        "lock_holder": client_id,
-                    }), exclude=None)
-            elif mtype == "release_lock":
-                await document_store.release_editor_lock(client_id)
-                await ws.send_text(json.dumps({"type": "lock_released"}))
-                await broadcast(json.dumps({
-                    "type": "lock_status",
-                    "is_locked": False,
-                    "lock_holder": None,
-                }), exclude=None)
-            elif mtype == "renew_lock":
-                renewed = await document_store.renew_editor_lock(client_id)
-                await ws.send_text(json.dumps({"type": "lock_renewed", "renewed": renewed}))
-            elif mtype == "edit":
-                lock_holder, is_locked = await document_store.get_lock_status()
-                if is_locked and lock_holder != client_id:
-                    await ws.send_text(json.dumps({
-                        "type": "error",
-                        "message": "edit_locked",
-                        "lock_holder": lock_holder,
-                    }))
-                    continue
-
-                new_content = message.get("content", "")
-                updated_version = await document_store.update_document(new_content)
-                await ws.send_text(json.dumps({"type": "ack", "version": updated_version}))
-                broadcast_payload = json.dumps({
-                    "type": "document",
-                    "content": new_content,
-                    "version": updated_version,
-                    "clients": len(clients.snapshot()),
-                    "lock_holder": lock_holder,
-                    "is_locked": is_locked,
-                })
-                await broadcast(broadcast_payload, exclude=ws)
-            else:
-                await ws.send_text(json.dumps({"type": "error", "message": "unknown_type"}))
+            mtype = message.get("type") if isinstance(message, dict) else None
+            handler = HANDLERS.get(mtype, _handle_unknown) if isinstance(mtype, str) else _handle_unknown
+            await handler(client, message)
     except WebSocketDisconnect:
         pass
     except Exception as exc:
         logging.exception("Unhandled error in websocket handler: %s", exc)
     finally:
+        # Land a debounced edit before giving up the editor lock; the ack may
+        # fail on a closed socket, but peers still receive the update.
+        try:
+            await client.pending_edits.flush()
+        except Exception as exc:
+            logging.debug("Pending edit ack not delivered: %s", exc)
         await document_store.release_editor_lock(client_id)
-        await broadcast(json.dumps({
-            "type": "lock_status",
-            "is_locked": False,
-            "lock_holder": None,
-        }), exclude=None)
+        await broadcast_lock_status(None)
         num = clients.remove(client_id)
         logging.info(f"Client {client_id} disconnected. Active clients={num}")
 
@@ -181,7 +450,20 @@ def main() -> None:
     import uvicorn
     host = os.environ.get("HOST", "0.0.0.0")
     port = int(os.environ.get("PORT", "8765"))
-    uvicorn.run("server:app", host=host, port=port, log_level="info")
+    uvicorn.run(
+        "server:app",
+        host=host,
+        port=port,
+        log_level="info",
+        # libuv-backed loop and C HTTP parser; uvloop does not support Windows.
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        ws="websockets",
+        # Oversized frames are rejected by the protocol layer before any parsing.
+        ws_max_size=MAX_MESSAGE_BYTES,
+        # Uvicorn's default, kept explicit: every frame, binary included, is JSON and compresses well.
+        ws_per_message_deflate=True,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from document_store import DocumentStore, DocumentTooLarge
+
+
+def test_replace_refused_while_another_client_holds_the_lock():
+    async def scenario():
+        store = DocumentStore()
+        assert await store.try_acquire_editor_lock("a")
+        result = await store.try_update_document("b", "intruder")
+        await store.release_editor_lock("a")
+        return result, await store.get_document()
+
+    result, document = asyncio.run(scenario())
+    assert result == (False, "a", 0)
+    assert document == ("", 0)
+
+
+def test_replace_allowed_for_holder_and_when_unlocked():
+    async def scenario():
+        store = DocumentStore()
+        unlocked = await store.try_update_document("b", "free")
+        assert await store.try_acquire_editor_lock("a")
+        held = await store.try_update_document("a", "held")
+        await store.release_editor_lock("a")
+        return unlocked, held, await store.get_document()
+
+    unlocked, held, document = asyncio.run(scenario())
+    assert unlocked == (True, None, 1)
+    assert held == (True, "a", 2)
+    assert document == ("held", 2)
+
+
+def test_ops_refused_without_a_holder():
+    async def scenario():
+        store = DocumentStore()
+        await store.update_document("abc")
+        inserted = await store.try_insert_text("a", 0, "x")
+        deleted = await store.try_delete_text("a", 0, 1)
+        return inserted, deleted, await store.get_document()
+
+    inserted, deleted, document = asyncio.run(scenario())
+    assert inserted == (False, None, 1)
+    assert deleted == (False, None, 1)
+    assert document == ("abc", 1)
+
+
+def test_ops_applied_for_holder():
+    async def scenario():
+        store = DocumentStore()
+        await store.update_document("abc")
+        assert await store.try_acquire_editor_lock("a")
+        inserted = await store.try_insert_text("a", 3, "def")
+        deleted = await store.try_delete_text("a", 0, 1)
+        await store.release_editor_lock("a")
+        return inserted, deleted, await store.get_document()
+
+    inserted, deleted, document = asyncio.run(scenario())
+    assert inserted == (True, "a", 2)
+    assert deleted == (True, "a", 3)
+    assert document == ("bcdef", 3)
+
+
+def test_edits_past_max_length_raise_and_leave_the_document_unchanged():
+    async def scenario():
+        store = DocumentStore(max_length=5)
+        assert await store.try_acquire_editor_lock("a")
+        await store.try_update_document("a", "abcde")
+        with pytest.raises(DocumentTooLarge):
+            await store.try_update_document("a", "abcdef")
+        with pytest.raises(DocumentTooLarge):
+            await store.try_insert_text("a", 5, "f")
+        await store.release_editor_lock("a")
+        return await store.get_document()
+
+    assert asyncio.run(scenario()) == ("abcde", 1)
+
+
+def test_lock_expires_after_timeout():
+    async def scenario():
+        store = DocumentStore(lock_timeout=0.01)
+        assert await store.try_acquire_editor_lock("a")
+        await asyncio.wait_for(store._expiry_task, timeout=5)
+        return await store.get_lock_status()
+
+    assert asyncio.run(scenario()) == (None, False)
+
+
+def test_renew_supersedes_pending_expiry():
+    async def scenario():
+        store = DocumentStore(lock_timeout=10.0)
+        assert await store.try_acquire_editor_lock("a")
+        first_timer = store._expiry_task
+        stale_generation = store._editor_lock_generation
+        assert await store.renew_editor_lock("a")
+        await asyncio.gather(first_timer, return_exceptions=True)
+        # A timer that woke just before the renewal must not clear the new lease.
+        await store._expire_after(0, stale_generation)
+        status = await store.get_lock_status()
+        await store.release_editor_lock("a")
+        return first_timer.cancelled(), status
+
+    cancelled, status = asyncio.run(scenario())
+    assert cancelled
+    assert status == ("a", True)
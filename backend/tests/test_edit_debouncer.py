@@ -0,0 +1,70 @@
+import asyncio
+
+import server
+from document_store import DocumentStore
+
+
+class FakeWebSocket:
+    def __init__(self) -> None:
+        self.sent = []
+
+    async def send_bytes(self, data: bytes) -> None:
+        self.sent.append(data)
+
+
+def test_submit_during_inflight_flush_is_applied():
+    async def scenario():
+        applied = []
+        started = asyncio.Event()
+        finish = asyncio.Event()
+
+        async def slow_apply(content):
+            started.set()
+            await finish.wait()
+            applied.append(content)
+
+        debouncer = server.EditDebouncer(slow_apply, delay=0.01)
+        debouncer.submit("a")
+        await started.wait()  # Timer has fired; "a" is being applied
+        debouncer.submit("b")
+        finish.set()
+        await asyncio.wait_for(debouncer._timer, timeout=5)
+        return applied
+
+    assert asyncio.run(scenario()) == ["a", "b"]
+
+
+def test_submits_within_window_are_coalesced():
+    async def scenario():
+        applied = []
+
+        async def apply(content):
+            applied.append(content)
+
+        debouncer = server.EditDebouncer(apply, delay=0.02)
+        for content in ("a", "ab", "abc"):
+            debouncer.submit(content)
+        await asyncio.sleep(0.05)
+        return applied
+
+    assert asyncio.run(scenario()) == ["abc"]
+
+
+def test_release_lock_flushes_pending_edit(monkeypatch):
+    store = DocumentStore()
+    monkeypatch.setattr(server, "document_store", store)
+    monkeypatch.setattr(server, "clients", server.ClientRegistry())
+    # Long enough that only an explicit flush can apply the edit.
+    monkeypatch.setattr(server, "EDIT_DEBOUNCE_SECONDS", 10.0)
+
+    async def scenario():
+        client = server.clients.add("c1", FakeWebSocket())
+        assert await store.try_acquire_editor_lock("c1")
+        client.pending_edits.submit("final text")
+        await server._handle_release_lock(client, {"type": "release_lock"})
+        server.clients.remove("c1")
+        return await store.get_document(), await store.get_lock_status()
+
+    (content, version), (holder, is_locked) = asyncio.run(scenario())
+    assert (content, version) == ("final text", 1)
+    assert (holder, is_locked) == (None, False)
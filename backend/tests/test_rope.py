@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+from rope import Rope
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_str_under_random_edits(seed, monkeypatch):
+    # Tiny chunks so edits regularly span, split and merge chunks.
+    monkeypatch.setattr(Rope, "CHUNK_SIZE", 7)
+    rng = random.Random(seed)
+    expected = "".join(rng.choice("abé\U0001f600") for _ in range(rng.randint(0, 40)))
+    rope = Rope(expected)
+
+    for _ in range(100):
+        pos = rng.randint(0, len(expected))
+        if rng.random() < 0.5:
+            text = "".join(rng.choice("xyz") for _ in range(rng.randint(0, 20)))
+            expected = expected[:pos] + text + expected[pos:]
+            rope.insert(pos, text)
+        else:
+            length = rng.randint(0, len(expected) - pos)
+            expected = expected[:pos] + expected[pos + length:]
+            rope.delete(pos, length)
+
+        assert str(rope) == expected
+        assert len(rope) == len(expected)
+        assert all(0 < len(chunk) <= Rope.CHUNK_SIZE for chunk in rope._chunks)
+
+
+def test_insert_into_empty_rope():
+    rope = Rope()
+    rope.insert(0, "hello")
+    assert str(rope) == "hello"
+    assert len(rope) == 5
+
+
+def test_locate_past_end_raises():
+    with pytest.raises(IndexError):
+        Rope("abc").insert(4, "x")
@@ -1,7 +1,8 @@
 import React, { useEffect, useMemo, useRef, useState } from 'react'
+import { applyOp, diffToOps } from './textOps.js'
 
 export default function Editor({ wsApi }) {
-  const { sendMessage, lastMessage, connectionStatus, clientId } = wsApi
+  const { sendMessage, inboxTick, takeMessages, connectionStatus, clientId } = wsApi
   const [content, setContent] = useState('')
   const [version, setVersion] = useState(0)
   const [clients, setClients] = useState(1)
@@ -10,8 +11,16 @@ export default function Editor({ wsApi }) {
   const [lockHolder, setLockHolder] = useState(null)
   const [hasLock, setHasLock] = useState(false)
   const textareaRef = useRef(null)
+  // Document as last agreed with the server; local edits are diffed against it.
+  const syncedRef = useRef('')
+  // Version of syncedRef; state lags behind when several messages are handled in one batch
+  const versionRef = useRef(0)
   const debounceTimer = useRef(null)
   const lockRenewalTimer = useRef(null)
+  // Retries get_document until a snapshot arrives; null when in sync
+  const resyncTimer = useRef(null)
+  // Local text typed while resyncing, re-diffed against the snapshot once it arrives
+  const pendingLocalRef = useRef(null)
 
   // Determine if the current user can edit
   const canEdit = useMemo(() => {
@@ -19,22 +28,49 @@ export default function Editor({ wsApi }) {
     return hasLock && lockHolder === clientId
   }, [isLocked, hasLock, lockHolder, clientId])
 
-  useEffect(() => {
-    if (!lastMessage) return
-    if (lastMessage.type === 'init' || lastMessage.type === 'document') {
+  const handleMessage = (message) => {
+    if (message.type === 'init' || message.type === 'document' || message.type === 'op') {
+      let nextContent = message.content
+      if (message.type === 'op') {
+        // Already covered by a newer snapshot
+        if (message.version <= versionRef.current) return
+        // A resync snapshot is already on its way
+        if (resyncTimer.current) return
+        // Missed an update: fall back to a full snapshot
+        if (message.version !== versionRef.current + 1) {
+          requestResync()
+          return
+        }
+        nextContent = applyOp(syncedRef.current, message)
+      }
+      syncedRef.current = nextContent
+      let syncStatusNext = 'synced'
+      if (message.type !== 'op' && resyncTimer.current) {
+        stopResync()
+        // Rebase text typed while out of sync onto the snapshot, if we may still edit
+        const local = pendingLocalRef.current
+        pendingLocalRef.current = null
+        const holdsLock = Boolean(clientId) && message.lock_holder === clientId
+        if (local !== null && local !== nextContent && (!message.is_locked || holdsLock)) {
+          sendEdit(local, holdsLock)
+          nextContent = local
+          syncStatusNext = 'pending'
+        }
+      }
       // Preserve cursor when applying updates
       const el = textareaRef.current
       const start = el ? el.selectionStart : 0
       const end = el ? el.selectionEnd : 0
-      setContent(lastMessage.content)
-      setVersion(lastMessage.version)
-      setClients(lastMessage.clients || clients)
-      setIsLocked(lastMessage.is_locked || false)
-      setLockHolder(lastMessage.lock_holder || null)
-      setSyncStatus('synced')
-      if (clientId && lastMessage.lock_holder === clientId) {
+      setContent(nextContent)
+      versionRef.current = message.version
+      setVersion(message.version)
+      setClients(message.clients || clients)
+      setIsLocked(message.is_locked || false)
+      setLockHolder(message.lock_holder || null)
+      setSyncStatus(syncStatusNext)
+      if (clientId && message.lock_holder === clientId) {
         setHasLock(true)
-      } else if (lastMessage.lock_holder !== clientId) {
+      } else if (message.lock_holder !== clientId) {
         setHasLock(false)
       }
       // Restore cursor after state flush
@@ -44,33 +80,48 @@ export default function Editor({ wsApi }) {
           el.selectionEnd = end
         }
       })
-    } else if (lastMessage.type === 'ack') {
-      setVersion(lastMessage.version)
+    } else if (message.type === 'ack') {
+      versionRef.current = message.version
+      setVersion(message.version)
       setSyncStatus('synced')
-    } else if (lastMessage.type === 'lock_response') {
-      if (lastMessage.acquired) {
+    } else if (message.type === 'lock_response') {
+      if (message.acquired) {
         setHasLock(true)
         setIsLocked(true)
         setLockHolder(clientId)
         startLockRenewal()
       }
-    } else if (lastMessage.type === 'lock_released') {
+    } else if (message.type === 'lock_released') {
       setHasLock(false)
       stopLockRenewal()
-    } else if (lastMessage.type === 'lock_status') {
-      setIsLocked(lastMessage.is_locked)
-      setLockHolder(lastMessage.lock_holder)
-      if (lastMessage.lock_holder !== clientId) {
+    } else if (message.type === 'lock_status') {
+      setIsLocked(message.is_locked)
+      setLockHolder(message.lock_holder)
+      if (message.lock_holder !== clientId) {
         setHasLock(false)
         stopLockRenewal()
       }
-    } else if (lastMessage.type === 'error') {
+    } else if (message.type === 'error') {
       setSyncStatus('error')
-      if (lastMessage.message === 'edit_locked') {
+      if (message.message !== 'invalid_json' && message.message !== 'unknown_type') {
+        // A rejected edit leaves syncedRef ahead of the server: rebase on a fresh
+        // snapshot. Ops rejected for a stale base are retried from the snapshot;
+        // locked or oversized content cannot be, and is replaced by it.
+        if (message.message === 'invalid_op' && !resyncTimer.current) {
+          pendingLocalRef.current = syncedRef.current
+        }
+        requestResync()
+      }
+      if (message.message === 'edit_locked') {
         requestLock()
       }
     }
-  }, [lastMessage, clientId, clients])
+  }
+
+  // Handle every frame in arrival order; ops applied back to back must each see the last
+  useEffect(() => {
+    takeMessages().forEach(handleMessage)
+  }, [inboxTick])
 
   // Auto-request lock when the editor becomes unlocked
   useEffect(() => {
@@ -93,6 +144,36 @@ export default function Editor({ wsApi }) {
     }
   }
 
+  const requestResync = () => {
+    if (resyncTimer.current) return
+    sendMessage({ type: 'get_document' })
+    // The reply can be lost (e.g. to a reconnect), so keep asking until one arrives
+    resyncTimer.current = setInterval(() => {
+      sendMessage({ type: 'get_document' })
+    }, 2000)
+  }
+
+  const stopResync = () => {
+    if (resyncTimer.current) {
+      clearInterval(resyncTimer.current)
+      resyncTimer.current = null
+    }
+  }
+
+  useEffect(() => stopResync, [])
+
+  const sendEdit = (next, holdsLock) => {
+    if (!holdsLock) {
+      // Ops are only accepted from the lock holder; fall back to last-write-wins replacement
+      syncedRef.current = next
+      sendMessage({ type: 'edit', content: next, version: versionRef.current })
+      return
+    }
+    const ops = diffToOps(syncedRef.current, next)
+    syncedRef.current = next
+    ops.forEach((op) => sendMessage({ type: 'edit', ...op }))
+  }
+
   const requestLock = () => {
     sendMessage({ type: 'request_lock' })
   }
@@ -113,7 +194,12 @@ export default function Editor({ wsApi }) {
     setSyncStatus('pending')
     if (debounceTimer.current) clearTimeout(debounceTimer.current)
     debounceTimer.current = setTimeout(() => {
-      sendMessage({ type: 'edit', content: next, version })
+      // Out of sync: hold the text until the snapshot it will be diffed against
+      if (resyncTimer.current) {
+        pendingLocalRef.current = next
+        return
+      }
+      sendEdit(next, hasLock)
     }, 300)
   }
 
@@ -0,0 +1,30 @@
+// Incremental edit operations exchanged with the backend.
+// Positions and lengths count Unicode code points so they match Python string offsets.
+
+export function diffToOps(prev, next) {
+  const a = Array.from(prev)
+  const b = Array.from(next)
+  let start = 0
+  while (start < a.length && start < b.length && a[start] === b[start]) start++
+  let endA = a.length
+  let endB = b.length
+  while (endA > start && endB > start && a[endA - 1] === b[endB - 1]) {
+    endA--
+    endB--
+  }
+  const ops = []
+  if (endA > start) ops.push({ op: 'delete', pos: start, len: endA - start })
+  if (endB > start) ops.push({ op: 'insert', pos: start, text: b.slice(start, endB).join('') })
+  return ops
+}
+
+export function applyOp(content, op) {
+  const chars = Array.from(content)
+  if (op.op === 'insert') {
+    return chars.slice(0, op.pos).join('') + op.text + chars.slice(op.pos).join('')
+  }
+  if (op.op === 'delete') {
+    return chars.slice(0, op.pos).join('') + chars.slice(op.pos + op.len).join('')
+  }
+  return content
+}
@@ -4,10 +4,16 @@ import { useCallback, useEffect, useRef, useState } from 'react'
 const DEFAULT_URL = import.meta.env.VITE_WS_URL || 
   (import.meta.env.DEV ? 'ws://localhost:8765/ws' : 'wss://colab-pri.onrender.com/ws')
 
+// Server messages arrive as binary frames holding UTF-8 encoded JSON
+const textDecoder = new TextDecoder()
+
 export function useWebSocket(url = DEFAULT_URL) {
   const wsRef = useRef(null)
   const [connectionStatus, setConnectionStatus] = useState('disconnected')
-  const [lastMessage, setLastMessage] = useState(null)
+  // Every inbound frame, in arrival order, until the consumer takes it. A single
+  // lastMessage slot would lose frames that arrive within one render batch.
+  const inboxRef = useRef([])
+  const [inboxTick, setInboxTick] = useState(0)
   const [clientId, setClientId] = useState(null)
   const reconnectRef = useRef({ attempts: 0, timer: null })
 
@@ -31,6 +37,7 @@ export function useWebSocket(url = DEFAULT_URL) {
     setConnectionStatus('connecting')
     const wsUrl = normalizeWsUrl(url)
     const ws = new WebSocket(wsUrl)
+    ws.binaryType = 'arraybuffer'
     wsRef.current = ws
 
     ws.onopen = () => {
@@ -40,11 +47,13 @@ export function useWebSocket(url = DEFAULT_URL) {
 
     ws.onmessage = (event) => {
       try {
-        const data = JSON.parse(event.data)
+        const raw = typeof event.data === 'string' ? event.data : textDecoder.decode(event.data)
+        const data = JSON.parse(raw)
         if (data && data.type === 'init' && data.client_id) {
           setClientId(data.client_id)
         }
-        setLastMessage(data)
+        inboxRef.current.push(data)
+        setInboxTick((tick) => tick + 1)
       } catch {
         // ignore malformed messages
       }
@@ -81,6 +90,9 @@ export function useWebSocket(url = DEFAULT_URL) {
     }
   }, [])
 
+  // Drain queued messages; call from an effect keyed on inboxTick
+  const takeMessages = useCallback(() => inboxRef.current.splice(0), [])
+
   useEffect(() => {
     connect()
     return () => {
@@ -90,7 +102,7 @@ export function useWebSocket(url = DEFAULT_URL) {
     }
   }, [connect])
 
-  return { sendMessage, lastMessage, connectionStatus, reconnect: connect, clientId }
+  return { sendMessage, inboxTick, takeMessages, connectionStatus, reconnect: connect, clientId }
 }
 
 